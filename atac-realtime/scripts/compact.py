@@ -0,0 +1,10 @@
+"""Compact finished days' Parquet part files into one sorted file per day. Meant for cron."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from scripts.ingest import compact_finished_days
+
+if __name__ == "__main__":
+    compact_finished_days()
@@ -1,17 +1,31 @@
 """
 ATAC GTFS-RT ingestion script.
 Fetches vehicle positions, trip updates, and service alerts every 60 seconds.
-Writes daily Parquet files partitioned by feed type.
+Writes daily Parquet part files partitioned by feed type.
 """
 
+import atexit
+import fcntl
 import logging
 import os
+import shutil
+import signal
+import sys
 import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from pathlib import Path
 
-import pandas as pd
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
+from requests.adapters import HTTPAdapter
+
+# Parse with the native upb backend; must be set before protobuf is imported
+os.environ.setdefault("PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION", "upb")
+from google.protobuf.internal import api_implementation
 from google.transit import gtfs_realtime_pb2
 
 logging.basicConfig(
@@ -21,7 +35,11 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+if api_implementation.Type() not in ("upb", "cpp"):
+    log.warning("Pure-Python protobuf backend in use, parsing will be slow (install protobuf>=4.21)")
+
 RAW_DIR = Path(__file__).resolve().parent.parent / "raw"
+POLL_INTERVAL = 60  # seconds, matches the feeds' refresh rate
 
 FEEDS = {
     "vehicle_positions": "https://romamobilita.it/sites/default/files/rome_rtgtfs_vehicle_positions_feed.pb",
@@ -34,112 +52,263 @@ FEEDS = {
 # Fetch
 # ---------------------------------------------------------------------------
 
-def fetch_feed(url: str) -> gtfs_realtime_pb2.FeedMessage:
-    """Fetch and parse a GTFS-RT protobuf feed."""
-    response = requests.get(url, timeout=30)
+# Shared session: keeps the TLS connection to romamobilita.it alive across
+# feeds and ticks instead of handshaking on every request.
+SESSION = requests.Session()
+SESSION.headers["Accept-Encoding"] = "gzip"
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+
+# One message per feed type, reused across ticks. Each tick's message is
+# fully parsed into columns before that feed is fetched again.
+FEED_MSGS = {feed_type: gtfs_realtime_pb2.FeedMessage() for feed_type in FEEDS}
+
+
+def fetch_feed(url: str, feed_type: str) -> gtfs_realtime_pb2.FeedMessage:
+    """Fetch and parse a GTFS-RT protobuf feed into its reusable message."""
+    response = SESSION.get(url, timeout=30)
     response.raise_for_status()
-    feed = gtfs_realtime_pb2.FeedMessage()
-    feed.ParseFromString(response.content)
+    feed = FEED_MSGS[feed_type]
+    feed.ParseFromString(response.content)  # clears the previous tick's contents
     return feed
 
 
+# ---------------------------------------------------------------------------
+# Schemas
+# ---------------------------------------------------------------------------
+
+# Explicit Arrow schemas so every tick writes identical column types,
+# regardless of which optional fields happen to be populated. GTFS-RT enums
+# (status, relationship, cause, effect) have <20 values and fit in int8.
+# IDs that repeat across rows and ticks (a few hundred routes, a few thousand
+# trips/vehicles) are dictionary-encoded: each string is stored once per
+# row group and rows carry int32 indices.
+DICT_STRING = pa.dictionary(pa.int32(), pa.string())
+
+SCHEMAS = {
+    "vehicle_positions": pa.schema([
+        ("feed_timestamp", pa.int64()),
+        ("entity_id", pa.string()),
+        ("trip_id", DICT_STRING),
+        ("route_id", DICT_STRING),
+        ("direction_id", pa.int32()),
+        ("start_date", DICT_STRING),
+        ("vehicle_id", DICT_STRING),
+        ("vehicle_label", pa.string()),
+        ("latitude", pa.float32()),
+        ("longitude", pa.float32()),
+        ("bearing", pa.float32()),
+        ("speed", pa.float32()),
+        ("current_stop_sequence", pa.int32()),
+        ("stop_id", pa.string()),
+        ("current_status", pa.int8()),
+        ("vehicle_timestamp", pa.int64()),
+    ]),
+    "trip_updates": pa.schema([
+        ("feed_timestamp", pa.int64()),
+        ("entity_id", pa.string()),
+        ("trip_id", DICT_STRING),
+        ("route_id", DICT_STRING),
+        ("start_date", DICT_STRING),
+        ("vehicle_id", DICT_STRING),
+        ("stop_sequence", pa.int32()),
+        ("stop_id", pa.string()),
+        ("arrival_delay", pa.int32()),
+        ("arrival_time", pa.int64()),
+        ("departure_delay", pa.int32()),
+        ("departure_time", pa.int64()),
+        ("schedule_relationship", pa.int8()),
+    ]),
+    "alerts": pa.schema([
+        ("feed_timestamp", pa.int64()),
+        ("entity_id", pa.string()),
+        ("cause", pa.int8()),
+        ("effect", pa.int8()),
+        ("header_text", pa.string()),
+        ("description_text", pa.string()),
+        ("route_id", DICT_STRING),
+        ("trip_id", DICT_STRING),
+        ("stop_id", pa.string()),
+        ("agency_id", pa.string()),
+    ]),
+}
+
+
 # ---------------------------------------------------------------------------
 # Parsers
 # ---------------------------------------------------------------------------
 
-def parse_vehicle_positions(feed: gtfs_realtime_pb2.FeedMessage) -> list[dict]:
-    """Flatten vehicle position entities into dicts."""
-    rows = []
-    ts = feed.header.timestamp
+Columns = dict[str, list | array]
+
+
+def _columns(feed_type: str) -> Columns:
+    """Empty columns for a feed type, in schema order (int8 enums as compact arrays)."""
+    return {
+        field.name: array("b") if field.type == pa.int8() else []
+        for field in SCHEMAS[feed_type]
+    }
+
+
+def parse_vehicle_positions(feed: gtfs_realtime_pb2.FeedMessage) -> Columns:
+    """Flatten vehicle position entities into column lists."""
+    cols = _columns("vehicle_positions")
+    # Bind the column lists and sub-messages to locals: protobuf attribute
+    # access is slow in Python, and this loop runs once per vehicle.
+    entity_ids = cols["entity_id"]
+    trip_ids = cols["trip_id"]
+    route_ids = cols["route_id"]
+    direction_ids = cols["direction_id"]
+    start_dates = cols["start_date"]
+    vehicle_ids = cols["vehicle_id"]
+    vehicle_labels = cols["vehicle_label"]
+    latitudes = cols["latitude"]
+    longitudes = cols["longitude"]
+    bearings = cols["bearing"]
+    speeds = cols["speed"]
+    stop_sequences = cols["current_stop_sequence"]
+    stop_ids = cols["stop_id"]
+    statuses = cols["current_status"]
+    vehicle_timestamps = cols["vehicle_timestamp"]
+
     for entity in feed.entity:
         vp = entity.vehicle
-        has_trip = vp.HasField("trip")
-        has_pos = vp.HasField("position")
-        has_veh = vp.HasField("vehicle")
-        rows.append({
-            "feed_timestamp": ts,
-            "entity_id": entity.id,
-            "trip_id": vp.trip.trip_id if has_trip else None,
-            "route_id": vp.trip.route_id if has_trip else None,
-            "direction_id": vp.trip.direction_id if has_trip else None,
-            "start_date": vp.trip.start_date if has_trip else None,
-            "vehicle_id": vp.vehicle.id if has_veh else None,
-            "vehicle_label": vp.vehicle.label if has_veh else None,
-            "latitude": vp.position.latitude if has_pos else None,
-            "longitude": vp.position.longitude if has_pos else None,
-            "bearing": vp.position.bearing if has_pos else None,
-            "speed": vp.position.speed if has_pos else None,
-            "current_stop_sequence": vp.current_stop_sequence,
-            "stop_id": vp.stop_id or None,
-            "current_status": vp.current_status,
-            "vehicle_timestamp": vp.timestamp,
-        })
-    return rows
-
-
-def parse_trip_updates(feed: gtfs_realtime_pb2.FeedMessage) -> list[dict]:
-    """Flatten trip update entities into dicts (one row per stop_time_update)."""
-    rows = []
-    ts = feed.header.timestamp
+        entity_ids.append(entity.id)
+
+        if vp.HasField("trip"):
+            trip = vp.trip
+            trip_ids.append(trip.trip_id)
+            route_ids.append(trip.route_id)
+            direction_ids.append(trip.direction_id)
+            start_dates.append(trip.start_date)
+        else:
+            trip_ids.append(None)
+            route_ids.append(None)
+            direction_ids.append(None)
+            start_dates.append(None)
+
+        if vp.HasField("vehicle"):
+            veh = vp.vehicle
+            vehicle_ids.append(veh.id)
+            vehicle_labels.append(veh.label)
+        else:
+            vehicle_ids.append(None)
+            vehicle_labels.append(None)
+
+        if vp.HasField("position"):
+            pos = vp.position
+            latitudes.append(pos.latitude)
+            longitudes.append(pos.longitude)
+            bearings.append(pos.bearing)
+            speeds.append(pos.speed)
+        else:
+            latitudes.append(None)
+            longitudes.append(None)
+            bearings.append(None)
+            speeds.append(None)
+
+        # Scalar fields return their default when unset, no presence check needed
+        stop_sequences.append(vp.current_stop_sequence)
+        stop_ids.append(vp.stop_id or None)
+        statuses.append(vp.current_status)
+        vehicle_timestamps.append(vp.timestamp)
+
+    cols["feed_timestamp"] = [feed.header.timestamp] * len(entity_ids)
+    return cols
+
+
+def parse_trip_updates(feed: gtfs_realtime_pb2.FeedMessage) -> Columns:
+    """Flatten trip update entities into column lists (one row per stop_time_update)."""
+    cols = _columns("trip_updates")
+    entity_ids = cols["entity_id"]
+    trip_ids = cols["trip_id"]
+    route_ids = cols["route_id"]
+    start_dates = cols["start_date"]
+    vehicle_ids = cols["vehicle_id"]
+    stop_sequences = cols["stop_sequence"]
+    stop_ids = cols["stop_id"]
+    arrival_delays = cols["arrival_delay"]
+    arrival_times = cols["arrival_time"]
+    departure_delays = cols["departure_delay"]
+    departure_times = cols["departure_time"]
+    relationships = cols["schedule_relationship"]
+
     for entity in feed.entity:
         tu = entity.trip_update
-        has_trip = tu.HasField("trip")
-        has_veh = tu.HasField("vehicle")
-        trip_id = tu.trip.trip_id if has_trip else None
-        route_id = tu.trip.route_id if has_trip else None
-        start_date = tu.trip.start_date if has_trip else None
-        vehicle_id = tu.vehicle.id if has_veh else None
-
-        for stu in tu.stop_time_update:
-            has_arr = stu.HasField("arrival")
-            has_dep = stu.HasField("departure")
-            rows.append({
-                "feed_timestamp": ts,
-                "entity_id": entity.id,
-                "trip_id": trip_id,
-                "route_id": route_id,
-                "start_date": start_date,
-                "vehicle_id": vehicle_id,
-                "stop_sequence": stu.stop_sequence,
-                "stop_id": stu.stop_id or None,
-                "arrival_delay": stu.arrival.delay if has_arr else None,
-                "arrival_time": stu.arrival.time if has_arr else None,
-                "departure_delay": stu.departure.delay if has_dep else None,
-                "departure_time": stu.departure.time if has_dep else None,
-                "schedule_relationship": stu.schedule_relationship,
-            })
-    return rows
-
-
-def parse_alerts(feed: gtfs_realtime_pb2.FeedMessage) -> list[dict]:
-    """Flatten service alert entities into dicts."""
-    rows = []
-    ts = feed.header.timestamp
+        updates = tu.stop_time_update
+        n = len(updates)
+        if not n:
+            continue
+
+        # Trip-level values repeat on every stop row
+        if tu.HasField("trip"):
+            trip = tu.trip
+            trip_ids.extend([trip.trip_id] * n)
+            route_ids.extend([trip.route_id] * n)
+            start_dates.extend([trip.start_date] * n)
+        else:
+            trip_ids.extend([None] * n)
+            route_ids.extend([None] * n)
+            start_dates.extend([None] * n)
+        vehicle_ids.extend([tu.vehicle.id if tu.HasField("vehicle") else None] * n)
+        entity_ids.extend([entity.id] * n)
+
+        for stu in updates:
+            stop_sequences.append(stu.stop_sequence)
+            stop_ids.append(stu.stop_id or None)
+            if stu.HasField("arrival"):
+                arr = stu.arrival
+                arrival_delays.append(arr.delay)
+                arrival_times.append(arr.time)
+            else:
+                arrival_delays.append(None)
+                arrival_times.append(None)
+            if stu.HasField("departure"):
+                dep = stu.departure
+                departure_delays.append(dep.delay)
+                departure_times.append(dep.time)
+            else:
+                departure_delays.append(None)
+                departure_times.append(None)
+            relationships.append(stu.schedule_relationship)
+
+    cols["feed_timestamp"] = [feed.header.timestamp] * len(entity_ids)
+    return cols
+
+
+def parse_alerts(feed: gtfs_realtime_pb2.FeedMessage) -> Columns:
+    """Flatten service alert entities into column lists."""
+    cols = _columns("alerts")
     for entity in feed.entity:
         alert = entity.alert
         # An alert can affect multiple routes/trips — create one row per informed entity
         informed = list(alert.informed_entity) or [None]
+        n = len(informed)
         header_text = ""
-        if alert.header_text and alert.header_text.translation:
+        if alert.header_text.translation:
             header_text = alert.header_text.translation[0].text
         description_text = ""
-        if alert.description_text and alert.description_text.translation:
+        if alert.description_text.translation:
             description_text = alert.description_text.translation[0].text
 
+        cols["entity_id"].extend([entity.id] * n)
+        cols["cause"].extend([alert.cause] * n)
+        cols["effect"].extend([alert.effect] * n)
+        cols["header_text"].extend([header_text] * n)
+        cols["description_text"].extend([description_text] * n)
         for ie in informed:
-            rows.append({
-                "feed_timestamp": ts,
-                "entity_id": entity.id,
-                "cause": alert.cause,
-                "effect": alert.effect,
-                "header_text": header_text,
-                "description_text": description_text,
-                "route_id": ie.route_id if ie and ie.route_id else None,
-                "trip_id": ie.trip.trip_id if ie and ie.HasField("trip") else None,
-                "stop_id": ie.stop_id if ie and ie.stop_id else None,
-                "agency_id": ie.agency_id if ie and ie.agency_id else None,
-            })
-    return rows
+            if ie is None:
+                cols["route_id"].append(None)
+                cols["trip_id"].append(None)
+                cols["stop_id"].append(None)
+                cols["agency_id"].append(None)
+                continue
+            cols["route_id"].append(ie.route_id or None)
+            cols["trip_id"].append(ie.trip.trip_id if ie.HasField("trip") else None)
+            cols["stop_id"].append(ie.stop_id or None)
+            cols["agency_id"].append(ie.agency_id or None)
+
+    cols["feed_timestamp"] = [feed.header.timestamp] * len(cols["entity_id"])
+    return cols
 
 
 PARSERS = {
@@ -153,46 +322,328 @@ PARSERS = {
 # Storage
 # ---------------------------------------------------------------------------
 
-def append_to_parquet(rows: list[dict], feed_type: str) -> None:
-    """Append rows to a daily Parquet file."""
-    if not rows:
-        return
+def _utc_today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _tmp_path(path: Path) -> Path:
+    """Hidden sibling name used while a file is being written; no *.parquet glob matches it."""
+    return path.with_name(f".{path.name}.tmp")
+
+
+# Files that can't be read (truncated by a killed process, or a temporary part
+# whose writer never finished) are moved here for manual inspection, so they
+# don't block the batch or day they belong to.
+QUARANTINE_DIR = RAW_DIR.parent / "quarantine"
+
+
+def _quarantine(path: Path, feed_type: str, day: str) -> None:
+    """Move a file out of the pipeline into quarantine/{feed_type}/{day}/."""
+    dest = QUARANTINE_DIR / feed_type / day / path.name
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(path, dest)
+    log.warning("%s: quarantined unreadable file %s", feed_type, dest)
+
+
+def _quarantine_broken(day_dir: Path, feed_type: str, max_tmp_age: float) -> list[Path]:
+    """Return a day directory's readable parts, quarantining the unreadable ones.
+
+    Temporary parts older than max_tmp_age seconds belong to a writer that
+    died before closing them and are quarantined too.
+    """
+    now = time.time()
+    for tmp in day_dir.glob(".*.tmp"):
+        if now - tmp.stat().st_mtime > max_tmp_age:
+            _quarantine(tmp, feed_type, day_dir.name)
+
+    parts = []
+    for part in sorted(day_dir.glob("*.parquet")):
+        try:
+            pq.read_metadata(part)
+        except Exception:
+            _quarantine(part, feed_type, day_dir.name)
+        else:
+            parts.append(part)
+    return parts
+
 
-    df = pd.DataFrame(rows)
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    out_dir = RAW_DIR / feed_type
+# One open writer per (feed_type, date). Each tick appends a row group instead
+# of rewriting the whole day's file. A Parquet file can't be reopened for
+# append once its footer is written, so every writer gets its own part file
+# inside the day directory. The part is written under a temporary name and
+# only renamed to *.parquet once its footer is written, so readers never see
+# an incomplete file. Writers rotate every PART_MAX_AGE seconds: the
+# long-running loop produces one part per hour (a crash loses at most that
+# hour), cron (one process per tick) one part per tick.
+PART_MAX_AGE = 3600
+
+# (feed_type, date) -> (writer, final part path, monotonic time opened)
+WRITERS: dict[tuple[str, str], tuple[pq.ParquetWriter, Path, float]] = {}
+
+
+def _close_writer(key: tuple[str, str]) -> None:
+    """Write the footer and publish the part under its final name."""
+    writer, path, _ = WRITERS.pop(key)
+    writer.close()
+    os.replace(_tmp_path(path), path)
+
+
+def _open_writer(feed_type: str, day: str, schema: pa.Schema, root: Path) -> pq.ParquetWriter:
+    """Open a new part file for a feed/day, closing writers left from older days."""
+    for key in [k for k in WRITERS if k[0] == feed_type and k[1] != day]:
+        _close_writer(key)
+
+    out_dir = root / feed_type / day
     out_dir.mkdir(parents=True, exist_ok=True)
-    path = out_dir / f"{today}.parquet"
+    stamp = datetime.now(timezone.utc).strftime("%H%M%S%f")
+    path = out_dir / f"{stamp}-{os.getpid()}.parquet"
+    writer = pq.ParquetWriter(_tmp_path(path), schema, compression="zstd")
+    WRITERS[(feed_type, day)] = (writer, path, time.monotonic())
+    return writer
 
-    if path.exists():
-        existing = pd.read_parquet(path)
-        df = pd.concat([existing, df], ignore_index=True)
 
-    df.to_parquet(path, index=False)
+def close_writers() -> None:
+    """Flush, close and publish every open Parquet part."""
+    for key in list(WRITERS):
+        try:
+            _close_writer(key)
+        except Exception:
+            log.exception("Error closing %s part for %s", *key)
+
+
+atexit.register(close_writers)
+
+
+def append_to_parquet(columns: Columns, feed_type: str, root: Path | None = None) -> None:
+    """Append columns as a new row group to today's Parquet part file under root (default RAW_DIR)."""
+    if not columns["feed_timestamp"]:
+        return
+
+    schema = SCHEMAS[feed_type]
+    table = pa.table(columns, schema=schema)
+    today = _utc_today()
+    key = (feed_type, today)
+    if key in WRITERS and time.monotonic() - WRITERS[key][2] >= PART_MAX_AGE:
+        _close_writer(key)
+    if key in WRITERS:
+        writer = WRITERS[key][0]
+    else:
+        writer = _open_writer(feed_type, today, schema, root or RAW_DIR)
+    writer.write_table(table)
 
 
 # ---------------------------------------------------------------------------
-# Main
+# Compaction
 # ---------------------------------------------------------------------------
 
-def run_once() -> None:
-    """Fetch all feeds once and append to daily Parquet files."""
-    for feed_type, url in FEEDS.items():
+# A day of vehicle positions is ~2-3M rows; large row groups keep per-column
+# statistics useful for pruning and cut footer/metadata reads.
+COMPACT_ROW_GROUP_SIZE = 200_000
+
+
+def _merge_parquet(sources: list[str], dest: Path) -> None:
+    """Write sources into dest sorted by feed_timestamp, replacing dest atomically."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(dest)
+    con = duckdb.connect()
+    try:
+        con.execute(f"""
+            COPY (
+                SELECT * FROM read_parquet({sources!r}, union_by_name=true)
+                ORDER BY feed_timestamp
+            ) TO '{tmp}' (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE {COMPACT_ROW_GROUP_SIZE})
+        """)
+    finally:
+        con.close()
+    os.replace(tmp, dest)
+
+
+def compact_day(feed_type: str, day: str) -> None:
+    """Merge a finished day's part files into one Parquet file sorted by feed_timestamp.
+
+    Safe to rerun after a crash at any step. Parts are first moved out of
+    raw/{feed_type}/ into raw/.compacting/, so they are never merged twice. The
+    merged file is built there, and the directory is renamed to raw/.compacted/
+    once the merge is complete. Only then is the merged file moved onto the
+    daily file and the consumed parts deleted.
+    """
+    feed_dir = RAW_DIR / feed_type
+    final = feed_dir / f"{day}.parquet"
+    work_dir = RAW_DIR / ".compacting" / feed_type / day
+    done_dir = RAW_DIR / ".compacted" / feed_type / day
+    merged = "merged.parquet.out"
+
+    # An earlier run completed its merge but died before publishing or cleaning up
+    if done_dir.exists():
+        if (done_dir / merged).exists():
+            os.replace(done_dir / merged, final)
+        shutil.rmtree(done_dir)
+
+    part_dir = feed_dir / day
+    if part_dir.is_dir():
+        work_dir.mkdir(parents=True, exist_ok=True)
+        for part in _quarantine_broken(part_dir, feed_type, 2 * PART_MAX_AGE):
+            os.replace(part, work_dir / part.name)
+        if not any(part_dir.iterdir()):
+            part_dir.rmdir()
+
+    parts = sorted(work_dir.glob("*.parquet"))
+    if not parts:
+        if work_dir.exists():
+            shutil.rmtree(work_dir)
+        return
+
+    sources = [str(p) for p in parts]
+    if final.exists():
+        # Pre-partitioning daily file, or parts that landed after an earlier compaction
+        sources.append(str(final))
+
+    _merge_parquet(sources, work_dir / merged)
+    done_dir.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(work_dir, done_dir)
+    os.replace(done_dir / merged, final)
+    shutil.rmtree(done_dir)
+    log.info("%s: compacted %d part file(s) into %s", feed_type, len(parts), final.name)
+
+
+def compact_finished_days() -> None:
+    """Compact every day older than today (UTC), for all feeds, including interrupted runs."""
+    today = _utc_today()
+    for feed_type in FEEDS:
+        days = set()
+        for parent in (RAW_DIR / feed_type, RAW_DIR / ".compacting" / feed_type, RAW_DIR / ".compacted" / feed_type):
+            if parent.is_dir():
+                days.update(d.name for d in parent.iterdir() if d.is_dir())
+        for day in sorted(d for d in days if d < today):
+            try:
+                compact_day(feed_type, day)
+            except Exception:
+                log.exception("Error compacting %s/%s", feed_type, day)
+
+
+# ---------------------------------------------------------------------------
+# Staging
+# ---------------------------------------------------------------------------
+
+# Under cron every tick is its own process and leaves one small part file per
+# feed. Those are staged on tmpfs and merged into raw/ every FLUSH_EVERY ticks,
+# so the disk (an SD card on a Pi) takes one write per batch instead of one per
+# tick. Ticks still waiting in staging are lost if the machine reboots.
+STAGING_DIR = Path("/dev/shm/atac")
+FLUSH_EVERY = 10
+# A cron tick lives well under a minute; temporary files older than this
+# were left behind by a killed process
+STAGED_TMP_MAX_AGE = 600
+
+
+def _flush_batch(feed_type: str, day: str, batch_dir: Path) -> None:
+    """Merge one staged batch into raw/ and drop it; safe to rerun after a crash.
+
+    The batch's files were moved into their own directory under
+    STAGING_DIR/.flushing/ first, and the output name is derived from that
+    directory, so redoing an interrupted batch overwrites the same part in
+    raw/ instead of adding a second copy. Renaming the directory into
+    .flushed/ marks the batch as published; only then are its files deleted.
+    """
+    staged = sorted(batch_dir.glob("*.parquet"))
+    dest = RAW_DIR / feed_type / day / f"{batch_dir.name}.parquet"
+    if staged:
+        _merge_parquet([str(p) for p in staged], dest)
+    done_dir = STAGING_DIR / ".flushed" / feed_type / day / batch_dir.name
+    done_dir.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(batch_dir, done_dir)
+    shutil.rmtree(done_dir)
+    log.info("%s: flushed %d staged tick(s) to %s", feed_type, len(staged), dest.parent)
+
+
+def flush_staging(min_files: int = FLUSH_EVERY) -> None:
+    """Move staged part files into raw/, one merged part per feed/day batch."""
+    # Staged files must be complete before they are read
+    close_writers()
+    today = _utc_today()
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    with open(STAGING_DIR / ".flush.lock", "w") as lock:
         try:
-            feed = fetch_feed(url)
-            rows = PARSERS[feed_type](feed)
-            append_to_parquet(rows, feed_type)
-            log.info("%s: %d rows", feed_type, len(rows))
-        except Exception:
-            log.exception("Error fetching %s", feed_type)
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return  # an overlapping cron tick is already flushing
+
+        for feed_type in FEEDS:
+            # Finish batches an interrupted flush left behind: published ones
+            # only need deleting, unpublished ones are redone
+            for done_dir in (STAGING_DIR / ".flushed" / feed_type).glob("*/*"):
+                shutil.rmtree(done_dir)
+            for batch_dir in sorted((STAGING_DIR / ".flushing" / feed_type).glob("*/*")):
+                try:
+                    _flush_batch(feed_type, batch_dir.parent.name, batch_dir)
+                except Exception:
+                    log.exception("Error flushing staged %s/%s", feed_type, batch_dir.parent.name)
+
+            feed_dir = STAGING_DIR / feed_type
+            if not feed_dir.is_dir():
+                continue
+            for day_dir in sorted(feed_dir.iterdir()):
+                past = day_dir.name < today
+                staged = _quarantine_broken(day_dir, feed_type, STAGED_TMP_MAX_AGE)
+                # Past days are flushed whatever their size, they won't grow any more
+                if staged and (len(staged) >= min_files or past):
+                    batch_dir = STAGING_DIR / ".flushing" / feed_type / day_dir.name / staged[0].stem
+                    batch_dir.mkdir(parents=True, exist_ok=True)
+                    for p in staged:
+                        os.replace(p, batch_dir / p.name)
+                    try:
+                        _flush_batch(feed_type, day_dir.name, batch_dir)
+                    except Exception:
+                        log.exception("Error flushing staged %s/%s", feed_type, day_dir.name)
+                if past and not any(day_dir.iterdir()):
+                    day_dir.rmdir()
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def run_once(root: Path | None = None) -> None:
+    """Fetch all feeds once and append to daily Parquet files under root (default RAW_DIR)."""
+    # Downloads overlap; parsing and writing stay on this thread as each one lands
+    with ThreadPoolExecutor(max_workers=len(FEEDS)) as executor:
+        futures = {executor.submit(fetch_feed, url, feed_type): feed_type for feed_type, url in FEEDS.items()}
+        for future in as_completed(futures):
+            feed_type = futures[future]
+            try:
+                feed = future.result()
+                columns = PARSERS[feed_type](feed)
+                append_to_parquet(columns, feed_type, root)
+                log.info("%s: %d rows", feed_type, len(columns["feed_timestamp"]))
+            except Exception:
+                log.exception("Error fetching %s", feed_type)
 
 
 def main() -> None:
-    log.info("Starting ATAC GTFS-RT ingestion (polling every 60s)")
+    log.info("Starting ATAC GTFS-RT ingestion (polling every %ds)", POLL_INTERVAL)
     log.info("Raw data dir: %s", RAW_DIR)
+    # atexit doesn't run on SIGTERM (systemctl/docker stop, kill): turn it into a
+    # normal exit so close_writers() publishes the open parts
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    day = _utc_today()
+    # Fixed-rate schedule on the monotonic clock: the time spent in run_once
+    # doesn't push later ticks back
+    next_tick = time.monotonic()
     while True:
         run_once()
-        time.sleep(60)
+        if _utc_today() != day:
+            # Day rolled over: publish yesterday's last parts. Compaction is left
+            # to the cron job (scripts/compact.py) so it never delays a tick.
+            close_writers()
+            day = _utc_today()
+
+        next_tick += POLL_INTERVAL
+        delay = next_tick - time.monotonic()
+        if delay < 0:
+            log.warning("Tick overran by %.1fs, resyncing schedule", -delay)
+            next_tick = time.monotonic()
+        else:
+            time.sleep(delay)
 
 
 if __name__ == "__main__":
@@ -4,7 +4,11 @@ import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
-from scripts.ingest import run_once
+from scripts.ingest import STAGING_DIR, flush_staging, run_once
 
 if __name__ == "__main__":
-    run_once()
+    if STAGING_DIR.parent.is_dir():  # tmpfs available (Linux /dev/shm)
+        run_once(STAGING_DIR)
+        flush_staging()
+    else:
+        run_once()
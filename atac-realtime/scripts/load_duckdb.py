@@ -8,6 +8,7 @@ Usage:
 """
 
 import argparse
+import csv
 import sys
 from pathlib import Path
 
@@ -19,6 +20,33 @@ STATIC_DIR = PROJECT_DIR / "static"
 RAW_DIR = PROJECT_DIR / "raw"
 
 
+# Numeric GTFS fields; everything else (IDs, names, HH:MM:SS times that can
+# exceed 24h, YYYYMMDD dates) stays VARCHAR.
+GTFS_TYPES = {
+    "stop_lat": "DOUBLE",
+    "stop_lon": "DOUBLE",
+    "location_type": "INTEGER",
+    "wheelchair_boarding": "INTEGER",
+    "route_type": "INTEGER",
+    "direction_id": "INTEGER",
+    "wheelchair_accessible": "INTEGER",
+    "bikes_allowed": "INTEGER",
+    "stop_sequence": "INTEGER",
+    "pickup_type": "INTEGER",
+    "drop_off_type": "INTEGER",
+    "timepoint": "INTEGER",
+    "shape_dist_traveled": "DOUBLE",
+    "exception_type": "INTEGER",
+}
+
+
+def gtfs_columns(path: Path) -> dict[str, str]:
+    """Column name → DuckDB type for a GTFS file, taken from its header row."""
+    with path.open(encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f))
+    return {name: GTFS_TYPES.get(name, "VARCHAR") for name in header}
+
+
 def load_static(con: duckdb.DuckDBPyConnection) -> None:
     """Load static GTFS text files as tables."""
     gtfs_files = {
@@ -37,34 +65,45 @@ def load_static(con: duckdb.DuckDBPyConnection) -> None:
         if not path.exists():
             print(f"  SKIP {table} ({filename} not found)")
             continue
+        # Explicit dialect and columns: skips DuckDB's sniffing pass over the file
+        columns = gtfs_columns(path)
         con.execute(f"DROP TABLE IF EXISTS {table}")
         con.execute(
-            f"CREATE TABLE {table} AS SELECT * FROM read_csv('{path}', all_varchar=true, auto_detect=true)"
+            f"CREATE TABLE {table} AS SELECT * FROM read_csv('{path}', "
+            f"header=true, delim=',', quote='\"', auto_detect=false, columns={columns!r})"
         )
         count = con.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
         print(f"  {table}: {count:,} rows")
 
 
+def parquet_days(feed_dir: Path) -> set[str]:
+    """Days with data for a feed, from file names alone (no Parquet reads)."""
+    # Daily files (YYYY-MM-DD.parquet) and per-day part files (YYYY-MM-DD/*.parquet)
+    return {
+        p.stem if p.parent == feed_dir else p.parent.name
+        for p in feed_dir.glob("**/*.parquet")
+    }
+
+
 def load_realtime(con: duckdb.DuckDBPyConnection) -> None:
     """Load raw real-time Parquet files as tables."""
     feeds = ["vehicle_positions", "trip_updates", "alerts"]
 
     for feed in feeds:
         feed_dir = RAW_DIR / feed
-        parquet_files = sorted(feed_dir.glob("*.parquet"))
-        if not parquet_files:
+        days = parquet_days(feed_dir)
+        if not days:
             print(f"  SKIP raw_{feed} (no parquet files)")
             continue
 
         table = f"raw_{feed}"
-        glob_pattern = str(feed_dir / "*.parquet")
+        glob_pattern = str(feed_dir / "**" / "*.parquet")
         con.execute(f"DROP TABLE IF EXISTS {table}")
         con.execute(
             f"CREATE TABLE {table} AS SELECT * FROM read_parquet('{glob_pattern}')"
         )
         count = con.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
-        days = len(parquet_files)
-        print(f"  {table}: {count:,} rows ({days} day(s))")
+        print(f"  {table}: {count:,} rows ({len(days)} day(s))")
 
 
 def print_summary(con: duckdb.DuckDBPyConnection) -> None:
@@ -75,13 +114,15 @@ def print_summary(con: duckdb.DuckDBPyConnection) -> None:
     print(f"\nDatabase: {DB_PATH}")
     print(f"Tables: {', '.join(t[0] for t in tables)}")
 
-    # Quick stats if real-time data exists
+    # Quick stats if real-time data exists. Aggregate the raw BIGINT column and
+    # convert only the results, instead of running to_timestamp/date_trunc on
+    # every row; days are UTC days (86400s buckets) present in the table.
     try:
         result = con.execute("""
             SELECT
-                min(to_timestamp(feed_timestamp)) AS first_ping,
-                max(to_timestamp(feed_timestamp)) AS last_ping,
-                count(DISTINCT date_trunc('day', to_timestamp(feed_timestamp))) AS days,
+                to_timestamp(min(feed_timestamp)) AS first_ping,
+                to_timestamp(max(feed_timestamp)) AS last_ping,
+                count(DISTINCT feed_timestamp // 86400) AS days,
                 count(*) AS total_rows
             FROM raw_vehicle_positions
         """).fetchone()